@@ -0,0 +1,152 @@
+-- database/scraped_articles.sql
+--
+-- Schema and server-side functions for the scraped_articles table used by
+-- storage/article_tracker.py. Run in the Supabase SQL editor; every
+-- statement is safe to re-run.
+
+-- =========================================================================
+-- Table
+-- =========================================================================
+
+create table if not exists scraped_articles (
+    id           bigserial primary key,
+    source_id    text not null,
+    url          text not null,
+    first_seen   timestamptz not null default now(),
+    last_checked timestamptz default now(),
+    unique (source_id, url)
+);
+
+-- last_checked is maintained server-side so clients never send it: it
+-- defaults to now() on insert, and the trigger bumps it on every update,
+-- including the ON CONFLICT DO UPDATE path of mark_as_seen's upserts
+alter table scraped_articles alter column last_checked set default now();
+
+create or replace function scraped_articles_set_last_checked()
+returns trigger
+language plpgsql as $$
+begin
+    new.last_checked := now();
+    return new;
+end
+$$;
+
+drop trigger if exists scraped_articles_last_checked on scraped_articles;
+create trigger scraped_articles_last_checked
+    before update on scraped_articles
+    for each row execute function scraped_articles_set_last_checked();
+
+-- =========================================================================
+-- Indexes
+-- =========================================================================
+-- On a large live table, create these with CREATE INDEX CONCURRENTLY
+-- (one statement at a time) to avoid blocking writes.
+
+-- Serves min/max(first_seen) per source in article_stats and the
+-- newest-first_seen lookup for ArticleTracker's high-water mark
+create index if not exists scraped_articles_source_first_seen_idx
+    on scraped_articles (source_id, first_seen desc);
+
+-- =========================================================================
+-- Statistics
+-- =========================================================================
+
+-- Article counts per source, largest first (ArticleTracker.get_source_counts)
+create or replace function source_counts()
+returns table (source_id text, article_count bigint)
+language sql stable as $$
+    select s.source_id, count(*)
+    from scraped_articles s
+    group by s.source_id
+    order by 2 desc
+$$;
+
+-- Count plus oldest/newest first_seen, for one source or all sources when
+-- p_source is null (ArticleTracker.get_stats)
+create or replace function article_stats(p_source text default null)
+returns table (total bigint, oldest timestamptz, newest timestamptz)
+language sql stable as $$
+    select count(*), min(s.first_seen), max(s.first_seen)
+    from scraped_articles s
+    where p_source is null or s.source_id = p_source
+$$;
+
+-- =========================================================================
+-- URL Tracking
+-- =========================================================================
+
+-- URLs from p_urls not yet stored for p_source (ArticleTracker.filter_new_articles).
+-- The whole list is one array parameter joined via unnest(), and each URL
+-- is probed through the unique (source_id, url) index.
+create or replace function filter_new_urls(p_source text, p_urls text[])
+returns table (url text)
+language sql stable as $$
+    select u
+    from unnest(p_urls) as u
+    where not exists (
+        select 1
+        from scraped_articles s
+        where s.source_id = p_source
+          and s.url = u
+    )
+$$;
+
+-- Whether p_url is stored for p_source (ArticleTracker.is_seen)
+create or replace function url_seen(p_source text, p_url text)
+returns boolean
+language sql stable as $$
+    select exists (
+        select 1
+        from scraped_articles s
+        where s.source_id = p_source
+          and s.url = p_url
+    )
+$$;
+
+-- Bump last_checked for URLs already stored for p_source, returning the
+-- number of rows updated (ArticleTracker.mark_as_seen). The update only
+-- touches the rows; scraped_articles_last_checked stamps now().
+create or replace function touch_urls(p_source text, p_urls text[])
+returns bigint
+language sql as $$
+    with updated as (
+        update scraped_articles s
+        set last_checked = s.last_checked
+        where s.source_id = p_source
+          and s.url = any(p_urls)
+        returning 1
+    )
+    select count(*) from updated
+$$;
+
+-- =========================================================================
+-- Maintenance
+-- =========================================================================
+
+-- Delete every URL for p_source, returning the number of rows deleted
+-- (ArticleTracker.clear_source)
+create or replace function clear_source(p_source text)
+returns bigint
+language plpgsql as $$
+declare
+    n bigint;
+begin
+    delete from scraped_articles where source_id = p_source;
+    get diagnostics n = row_count;
+    return n;
+end
+$$;
+
+-- Delete every URL for all sources, returning the number of rows deleted
+-- (ArticleTracker.clear_all)
+create or replace function clear_all_articles()
+returns bigint
+language plpgsql as $$
+declare
+    n bigint;
+begin
+    delete from scraped_articles where true;
+    get diagnostics n = row_count;
+    return n;
+end
+$$;
@@ -8,6 +8,7 @@ Simple URL-based tracking: store URLs when discovered, filter against them next
 Database Schema:
     - scraped_articles table: stores seen URLs per source
     - Unique constraint on (source_id, url) for fast lookups
+    - Table and RPC functions are defined in database/scraped_articles.sql
 
 Usage:
     tracker = ArticleTracker()
@@ -19,16 +20,156 @@ Usage:
 """
 
 import os
-from typing import Optional, List
-from datetime import datetime
+import re
+import sys
+import queue
+import atexit
+import asyncio
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import itertools
+from typing import Optional, List, Dict
+from datetime import date, datetime, timedelta, timezone
 
 # Import Supabase client
 try:
-    from supabase import create_client, Client
+    import httpx
+    from supabase import create_async_client, AsyncClient, AsyncClientOptions
     SUPABASE_AVAILABLE = True
 except ImportError:
     SUPABASE_AVAILABLE = False
-    Client = None
+    AsyncClient = None
+
+
+logger = logging.getLogger(__name__)
+
+# Background thread that writes this module's log records
+_log_listener: Optional[QueueListener] = None
+
+
+class _AppLogForwarder(logging.Handler):
+    """
+    Hand queued records to the application's root handlers.
+
+    Looks the handlers up per record, so logging configured after the
+    tracker connects is still honoured. Falls back to stderr when the
+    application has configured no handlers at all.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._fallback = logging.StreamHandler(sys.stderr)
+        self._fallback.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record: logging.LogRecord):
+        handlers = logging.getLogger().handlers or [self._fallback]
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _start_log_listener():
+    """
+    Route this module's logging through a queue drained by a background thread.
+
+    Tracker methods log from inside the event loop; the QueueHandler only
+    enqueues, and the listener thread passes records on to the
+    application's handlers, so their stream writes stay out of the
+    coroutines. Levels and formatting remain the application's.
+    """
+    global _log_listener
+
+    if _log_listener is not None:
+        return
+
+    # Without any logging config, INFO would otherwise be dropped
+    if not logging.getLogger().handlers and logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    # Records reach the app's handlers via the listener, not propagation
+    logger.propagate = False
+
+    _log_listener = QueueListener(log_queue, _AppLogForwarder())
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+
+# Shared client instance (one connection pool for all trackers)
+_client: Optional[AsyncClient] = None
+_client_lock = asyncio.Lock()
+
+
+async def _get_shared_client(supabase_url: str, supabase_key: str) -> AsyncClient:
+    """
+    Get or create the Supabase client shared by all ArticleTracker instances.
+
+    Each scraper creates its own tracker, so building a client per instance
+    would repeat the TLS/auth setup and open a new connection pool every time.
+
+    Returns:
+        Supabase client backed by a bounded keep-alive connection pool
+    """
+    global _client
+
+    async with _client_lock:
+        if _client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+                timeout=10.0,
+            )
+            _client = await create_async_client(
+                supabase_url,
+                supabase_key,
+                options=AsyncClientOptions(httpx_client=http_client, postgrest_client_timeout=10),
+            )
+        return _client
+
+
+# Per-source URLs known to be in the database, in insertion order, shared
+# by all trackers in the process (oldest evicted past _SEEN_CACHE_SIZE)
+_seen_cache: Dict[str, Dict[str, None]] = {}
+_SEEN_CACHE_SIZE = 100_000
+
+# Per-source newest first_seen, shared by all trackers in the process;
+# None if the source is empty or loading failed
+_highwater: Dict[str, Optional[datetime]] = {}
+
+
+# Publication date embedded in a URL path: /YYYY/MM/ or /YYYY/MM/DD/
+_URL_DATE_PATTERN = re.compile(r"/(20\d{2})/(0?[1-9]|1[0-2])/(?:(0?[1-9]|[12]\d|3[01])/)?")
+
+
+def _is_dated_after(url: str, high_water: datetime, today: date) -> bool:
+    """
+    Check if a URL's path date proves it was published after high_water.
+
+    Path dates are in the publisher's local time while high_water is UTC,
+    so a URL only counts once its date is past high_water plus one day
+    (the most any timezone runs ahead of UTC). Only dates up to today
+    count, so future-dated URLs (e.g. event pages) are never classified
+    as new this way.
+
+    Returns:
+        True if the URL embeds a date later than the day (or month, for
+        /YYYY/MM/ paths) of high_water + 1 day; False otherwise
+    """
+    match = _URL_DATE_PATTERN.search(url)
+    if not match:
+        return False
+
+    year, month = int(match.group(1)), int(match.group(2))
+    cutoff = (high_water + timedelta(days=1)).date()
+
+    if match.group(3):
+        try:
+            url_date = date(year, month, int(match.group(3)))
+        except ValueError:
+            return False
+        return cutoff < url_date <= today
+
+    return (cutoff.year, cutoff.month) < (year, month) <= (today.year, today.month)
 
 
 class ArticleTracker:
@@ -41,6 +182,17 @@ class ArticleTracker:
     # ========================================
     TEST_MODE = os.getenv("SCRAPER_TEST_MODE", "").lower() == "true"
 
+    TABLE_NAME = "scraped_articles"
+
+    # Rows per upsert request (keeps payloads under PostgREST body limits)
+    UPSERT_BATCH_SIZE = 500
+
+    # URLs per filter_new_urls RPC call (sent as one array parameter)
+    LOOKUP_BATCH_SIZE = 500
+
+    # Rows per page when reading a whole table or source (PostgREST max-rows)
+    PAGE_SIZE = 1000
+
     def __init__(self):
         """Initialize article tracker with Supabase credentials from environment."""
         if not SUPABASE_AVAILABLE:
@@ -52,28 +204,78 @@ class ArticleTracker:
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
 
-        self.client: Optional[Client] = None
+        self.client: Optional[AsyncClient] = None
+        self._table = None
 
     async def connect(self):
         """Connect to Supabase."""
         if self.client:
             return
 
+        _start_log_listener()
+
         try:
-            self.client = create_client(self.supabase_url, self.supabase_key)
+            self.client = await _get_shared_client(self.supabase_url, self.supabase_key)
+
+            # Request builder for the table, reused by every query
+            # (each .select()/.upsert() call starts a fresh request)
+            self._table = self.client.table(self.TABLE_NAME)
 
             # Test connection by attempting a simple query
-            self.client.table("scraped_articles").select("id").limit(1).execute()
+            await self._table.select("url").limit(1).execute()
 
             # Show mode status
             if self.TEST_MODE:
-                print("⚠️  Article tracker TEST MODE ENABLED - all articles will appear as 'new'")
+                logger.warning("⚠️  Article tracker TEST MODE ENABLED - all articles will appear as 'new'")
 
-            print("✅ Article tracker connected to Supabase")
+            logger.info("✅ Article tracker connected to Supabase")
 
         except Exception as e:
             raise RuntimeError(f"Failed to connect to Supabase: {e}")
 
+    async def _get_highwater(self, source_id: str) -> Optional[datetime]:
+        """
+        Get the newest first_seen for a source, loading it on first use.
+
+        Returns:
+            Timezone-aware datetime, or None if the source has no URLs
+            or loading failed
+        """
+        if source_id in _highwater:
+            return _highwater[source_id]
+
+        try:
+            # Newest row only - served by the (source_id, first_seen desc) index
+            response = await self._table\
+                .select("first_seen")\
+                .eq("source_id", source_id)\
+                .order("first_seen", desc=True)\
+                .limit(1)\
+                .execute()
+
+            newest = response.data[0]["first_seen"] if response.data else None
+            highwater = datetime.fromisoformat(newest) if newest else None
+            if highwater and highwater.tzinfo is None:
+                highwater = highwater.replace(tzinfo=timezone.utc)
+
+        except Exception as e:
+            logger.warning("   ⚠️  Error loading high-water mark: %s", e)
+            highwater = None
+
+        _highwater[source_id] = highwater
+        return highwater
+
+    def _cache_seen(self, source_id: str, urls):
+        """Remember URLs as seen for a source, evicting the oldest past _SEEN_CACHE_SIZE."""
+        cache = _seen_cache.setdefault(source_id, {})
+        for url in urls:
+            cache[url] = None
+
+        overflow = len(cache) - _SEEN_CACHE_SIZE
+        if overflow > 0:
+            for url in list(itertools.islice(cache, overflow)):
+                del cache[url]
+
     # =========================================================================
     # URL Tracking - Core Methods
     # =========================================================================
@@ -85,15 +287,20 @@ class ArticleTracker:
         This is the main method for detecting new articles.
         Respects TEST_MODE: when enabled, returns all URLs as "new".
 
-        Uses batched queries to avoid exceeding PostgREST URL length
-        limits when checking large numbers of URLs (e.g. 300+).
+        URLs already in the in-memory seen cache are skipped, and URLs whose
+        path date is later than the source's newest first_seen are returned
+        as new without a database lookup.
+
+        The remaining URLs are checked server-side by the filter_new_urls
+        RPC, which takes the whole batch as a single array parameter.
 
         Args:
             source_id: Source identifier (e.g., 'bauwelt')
             urls: List of article URLs found on homepage
 
         Returns:
-            List of URLs not previously seen (new articles)
+            List of URLs not previously seen (new articles), deduplicated
+            in first-seen order
         """
         if not self.client:
             raise RuntimeError("Not connected to Supabase")
@@ -103,34 +310,60 @@ class ArticleTracker:
 
         # TEST MODE: Return all URLs as "new" for testing
         if self.TEST_MODE:
-            print(f"   ⚠️  TEST MODE: Returning ALL {len(urls)} URLs as 'new'")
+            logger.warning("   ⚠️  TEST MODE: Returning ALL %d URLs as 'new'", len(urls))
             return urls
 
-        try:
-            # Batch the .in_() query to avoid exceeding PostgREST
-            # URL length limits (347 long URLs ≈ 35KB query string)
-            BATCH_SIZE = 50
-            seen_urls = set()
-
-            for i in range(0, len(urls), BATCH_SIZE):
-                batch = urls[i:i + BATCH_SIZE]
-                response = self.client.table("scraped_articles")\
-                    .select("url")\
-                    .eq("source_id", source_id)\
-                    .in_("url", batch)\
-                    .execute()
+        # Homepages often link the same article several times
+        urls = list(dict.fromkeys(urls))
 
-                seen_urls.update(row["url"] for row in response.data)
+        try:
+            # URLs confirmed seen earlier in this process need no lookup
+            cache = _seen_cache.get(source_id, {})
+            uncached = [url for url in urls if url not in cache]
+
+            # URLs dated after the newest stored URL can't have been seen.
+            # Only worth a lookup when it could skip the RPC entirely, i.e.
+            # every uncached URL carries a date
+            undecided = uncached
+            if uncached and all(_URL_DATE_PATTERN.search(url) for url in uncached):
+                highwater = await self._get_highwater(source_id)
+                today = datetime.now(timezone.utc).date()
+                if highwater is not None and all(
+                    _is_dated_after(url, highwater, today) for url in uncached
+                ):
+                    undecided = []
+
+            # Postgres returns the URLs it has no row for; batches bound
+            # the request body size and run concurrently
+            batches = [
+                undecided[i:i + self.LOOKUP_BATCH_SIZE]
+                for i in range(0, len(undecided), self.LOOKUP_BATCH_SIZE)
+            ]
+            responses = await asyncio.gather(*[
+                self.client.rpc(
+                    "filter_new_urls", {"p_source": source_id, "p_urls": batch}
+                ).execute()
+                for batch in batches
+            ])
+
+            db_new = frozenset(row["url"] for response in responses for row in response.data)
+            db_seen = frozenset(url for url in undecided if url not in db_new)
+
+            self._cache_seen(source_id, db_seen)
 
             # Return URLs not in database
-            new_urls = [url for url in urls if url not in seen_urls]
+            new_urls = [url for url in uncached if url not in db_seen]
 
-            print(f"   Database: {len(seen_urls)} seen, {len(new_urls)} new (checked in {(len(urls) - 1) // BATCH_SIZE + 1} batches)")
+            logger.info(
+                "   Database: %d seen, %d new (%d cached, %d new by date, checked in %d batches)",
+                len(urls) - len(new_urls), len(new_urls), len(urls) - len(uncached),
+                len(uncached) - len(undecided), len(batches),
+            )
 
             return new_urls
 
         except Exception as e:
-            print(f"   ⚠️  Error filtering URLs: {e}")
+            logger.warning("   ⚠️  Error filtering URLs: %s", e)
             # On error, return all URLs as "new" to be safe
             return urls
 
@@ -141,6 +374,10 @@ class ArticleTracker:
         Call this after discovering URLs on homepage to track them
         for future runs.
 
+        Duplicate URLs are dropped before upserting. URLs already in the
+        seen cache only get last_checked bumped in a single RPC; the rest
+        are upserted in batches.
+
         Args:
             source_id: Source identifier
             urls: List of article URLs to mark as seen
@@ -154,28 +391,77 @@ class ArticleTracker:
         if not urls:
             return 0
 
-        marked = 0
-        current_time = datetime.utcnow().isoformat()
+        # Batched upserts are rejected outright if a URL repeats within one
+        # statement ("ON CONFLICT DO UPDATE command cannot affect row a
+        # second time"), which would leave the whole batch unstored
+        urls = list(dict.fromkeys(urls))
 
-        for url in urls:
-            try:
-                # Try to insert new record
-                # If URL already exists, update last_checked timestamp
-                self.client.table("scraped_articles").upsert({
-                    "source_id": source_id,
-                    "url": url,
-                    "last_checked": current_time
-                }, on_conflict="source_id,url").execute()
-
-                marked += 1
-
-            except Exception as e:
-                print(f"   ⚠️  Error marking URL as seen: {e}")
-                continue
-
-        print(f"   Marked {marked} URLs as seen in database")
+        # URLs known to be stored only need last_checked updated
+        cache = _seen_cache.get(source_id, {})
+        known_urls = [url for url in urls if url in cache]
+        unknown_urls = [url for url in urls if url not in cache]
+
+        # Insert new records, or update last_checked if the URL already
+        # exists - one upsert per batch, with batches sent concurrently.
+        # last_checked is set to now() by the database on insert and update.
+        rows = [{"source_id": source_id, "url": url} for url in unknown_urls]
+
+        tasks = [
+            self._upsert_batch(source_id, rows[i:i + self.UPSERT_BATCH_SIZE])
+            for i in range(0, len(rows), self.UPSERT_BATCH_SIZE)
+        ]
+        if known_urls:
+            tasks.append(self._touch_urls(source_id, known_urls))
+
+        results = await asyncio.gather(*tasks)
+        marked = sum(results)
+
+        # Stored rows are stamped now(), so nothing newer has been seen
+        if marked:
+            _highwater[source_id] = datetime.now(timezone.utc)
+
+        logger.info("   Marked %d URLs as seen in database (%d already tracked)", marked, len(known_urls))
         return marked
 
+    async def _upsert_batch(self, source_id: str, batch: List[dict]) -> int:
+        """
+        Upsert one batch of scraped_articles rows and record them as seen.
+
+        Returns:
+            Number of rows written (0 if the request failed)
+        """
+        try:
+            await self._table\
+                .upsert(batch, on_conflict="source_id,url", returning="minimal")\
+                .execute()
+
+        except Exception as e:
+            logger.warning("   ⚠️  Error marking URLs as seen: %s", e)
+            return 0
+
+        batch_urls = [row["url"] for row in batch]
+        self._cache_seen(source_id, batch_urls)
+
+        return len(batch)
+
+    async def _touch_urls(self, source_id: str, urls: List[str]) -> int:
+        """
+        Update last_checked for URLs already stored, without re-upserting them.
+
+        Returns:
+            Number of rows updated (0 if the request failed)
+        """
+        try:
+            response = await self.client.rpc(
+                "touch_urls", {"p_source": source_id, "p_urls": urls}
+            ).execute()
+
+        except Exception as e:
+            logger.warning("   ⚠️  Error updating last_checked: %s", e)
+            return 0
+
+        return response.data or 0
+
     async def is_seen(self, source_id: str, url: str) -> bool:
         """
         Check if a single URL has been seen before.
@@ -194,18 +480,22 @@ class ArticleTracker:
         if self.TEST_MODE:
             return False
 
-        try:
-            response = self.client.table("scraped_articles")\
-                .select("id")\
-                .eq("source_id", source_id)\
-                .eq("url", url)\
-                .limit(1)\
-                .execute()
+        if url in _seen_cache.get(source_id, {}):
+            return True
 
-            return len(response.data) > 0
+        try:
+            # EXISTS check server-side - returns a bare boolean, no row payload
+            response = await self.client.rpc(
+                "url_seen", {"p_source": source_id, "p_url": url}
+            ).execute()
+
+            if response.data:
+                self._cache_seen(source_id, [url])
+                return True
+            return False
 
         except Exception as e:
-            print(f"   ⚠️  Error checking URL: {e}")
+            logger.warning("   ⚠️  Error checking URL: %s", e)
             return False
 
     # =========================================================================
@@ -226,65 +516,21 @@ class ArticleTracker:
             raise RuntimeError("Not connected to Supabase")
 
         try:
-            if source_id:
-                # Count for specific source
-                count_response = self.client.table("scraped_articles")\
-                    .select("id", count="exact")\
-                    .eq("source_id", source_id)\
-                    .execute()
-
-                count = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
-
-                # Get oldest and newest
-                oldest_response = self.client.table("scraped_articles")\
-                    .select("first_seen")\
-                    .eq("source_id", source_id)\
-                    .order("first_seen", desc=False)\
-                    .limit(1)\
-                    .execute()
-
-                newest_response = self.client.table("scraped_articles")\
-                    .select("first_seen")\
-                    .eq("source_id", source_id)\
-                    .order("first_seen", desc=True)\
-                    .limit(1)\
-                    .execute()
-
-                oldest = oldest_response.data[0]["first_seen"] if oldest_response.data else None
-                newest = newest_response.data[0]["first_seen"] if newest_response.data else None
-
-            else:
-                # Count all articles
-                count_response = self.client.table("scraped_articles")\
-                    .select("id", count="exact")\
-                    .execute()
+            # Count, oldest and newest in a single round-trip
+            response = await self.client.rpc(
+                "article_stats", {"p_source": source_id or None}
+            ).execute()
 
-                count = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
-
-                # Get oldest and newest
-                oldest_response = self.client.table("scraped_articles")\
-                    .select("first_seen")\
-                    .order("first_seen", desc=False)\
-                    .limit(1)\
-                    .execute()
-
-                newest_response = self.client.table("scraped_articles")\
-                    .select("first_seen")\
-                    .order("first_seen", desc=True)\
-                    .limit(1)\
-                    .execute()
-
-                oldest = oldest_response.data[0]["first_seen"] if oldest_response.data else None
-                newest = newest_response.data[0]["first_seen"] if newest_response.data else None
+            row = response.data[0] if response.data else {}
 
             return {
-                "total_articles": count or 0,
-                "oldest_seen": oldest,
-                "newest_seen": newest,
+                "total_articles": row.get("total") or 0,
+                "oldest_seen": row.get("oldest"),
+                "newest_seen": row.get("newest"),
             }
 
         except Exception as e:
-            print(f"   ⚠️  Error getting stats: {e}")
+            logger.warning("   ⚠️  Error getting stats: %s", e)
             return {
                 "total_articles": 0,
                 "oldest_seen": None,
@@ -302,23 +548,39 @@ class ArticleTracker:
             raise RuntimeError("Not connected to Supabase")
 
         try:
-            # Get all articles grouped by source
-            response = self.client.table("scraped_articles")\
-                .select("source_id")\
-                .execute()
+            # GROUP BY runs in Postgres (already sorted by count descending)
+            response = await self.client.rpc("source_counts").execute()
+
+            return {row["source_id"]: row["article_count"] for row in response.data}
+
+        except Exception as e:
+            logger.warning("   ⚠️  source_counts RPC failed, counting page by page: %s", e)
 
-            # Count manually since Supabase doesn't have GROUP BY in the Python client
+        try:
+            # Fallback: stream source_id pages and count incrementally
             counts = {}
-            for row in response.data:
-                source_id = row["source_id"]
-                counts[source_id] = counts.get(source_id, 0) + 1
+            offset = 0
+
+            while True:
+                response = await self._table\
+                    .select("source_id")\
+                    .order("id")\
+                    .range(offset, offset + self.PAGE_SIZE - 1)\
+                    .execute()
+
+                for row in response.data:
+                    source_id = row["source_id"]
+                    counts[source_id] = counts.get(source_id, 0) + 1
+
+                if len(response.data) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
 
             # Sort by count descending
-            sorted_counts = dict(sorted(counts.items(), key=lambda x: x[1], reverse=True))
-            return sorted_counts
+            return dict(sorted(counts.items(), key=lambda x: x[1], reverse=True))
 
         except Exception as e:
-            print(f"   ⚠️  Error getting source counts: {e}")
+            logger.warning("   ⚠️  Error getting source counts: %s", e)
             return {}
 
     # =========================================================================
@@ -340,25 +602,21 @@ class ArticleTracker:
             raise RuntimeError("Not connected to Supabase")
 
         try:
-            # First, count how many we're deleting
-            count_response = self.client.table("scraped_articles")\
-                .select("id", count="exact")\
-                .eq("source_id", source_id)\
-                .execute()
+            # Delete and count in one round-trip
+            response = await self.client.rpc(
+                "clear_source", {"p_source": source_id}
+            ).execute()
 
-            count = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
+            count = response.data or 0
 
-            # Delete all articles for this source
-            self.client.table("scraped_articles")\
-                .delete()\
-                .eq("source_id", source_id)\
-                .execute()
+            _seen_cache.pop(source_id, None)
+            _highwater.pop(source_id, None)
 
-            print(f"[{source_id}] Cleared {count} tracked URLs")
+            logger.info("[%s] Cleared %d tracked URLs", source_id, count)
             return count
 
         except Exception as e:
-            print(f"   ⚠️  Error clearing source: {e}")
+            logger.warning("   ⚠️  Error clearing source: %s", e)
             return 0
 
     async def clear_all(self) -> int:
@@ -373,24 +631,19 @@ class ArticleTracker:
             raise RuntimeError("Not connected to Supabase")
 
         try:
-            # First, count total
-            count_response = self.client.table("scraped_articles")\
-                .select("id", count="exact")\
-                .execute()
+            # Delete and count in one round-trip
+            response = await self.client.rpc("clear_all_articles").execute()
 
-            count = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
+            count = response.data or 0
 
-            # Delete all articles
-            self.client.table("scraped_articles")\
-                .delete()\
-                .neq("id", 0)\
-                .execute()  # Delete where id != 0 (deletes all)
+            _seen_cache.clear()
+            _highwater.clear()
 
-            print(f"⚠️  Cleared ALL {count} tracked URLs from database")
+            logger.warning("⚠️  Cleared ALL %d tracked URLs from database", count)
             return count
 
         except Exception as e:
-            print(f"   ⚠️  Error clearing all: {e}")
+            logger.warning("   ⚠️  Error clearing all: %s", e)
             return 0
 
     # =========================================================================
@@ -399,7 +652,8 @@ class ArticleTracker:
 
     async def close(self):
         """Close Supabase connection (cleanup if needed)."""
-        # Supabase client doesn't need explicit closing
-        # But we'll set it to None for consistency
+        # The client is shared with other trackers, so only drop
+        # this instance's reference and leave the pool open
         self.client = None
-        print("✅ Article tracker disconnected")
\ No newline at end of file
+        self._table = None
+        logger.info("✅ Article tracker disconnected")
\ No newline at end of file